@@ -5,38 +5,111 @@ Implementation of the JSON-LD Context structure. See:
     http://json-ld.org/
 
 """
-from collections import namedtuple
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
+from weakref import WeakSet
+
 from rdflib.namespace import RDF
 
 from ._compat import basestring, unicode
 from .keys import (BASE, CONTAINER, CONTEXT, GRAPH, ID, INDEX, LANG, LIST,
         REV, SET, TYPE, VALUE, VOCAB)
 from . import errors
-from .util import source_to_json, urljoin, urlsplit, split_iri, norm_url
+from .util import json, source_to_json, urljoin, urlsplit, split_iri, norm_url
 
 
 NODE_KEYS = set([LANG, ID, TYPE, VALUE, LIST, SET, REV, GRAPH])
 
+_MISSING = object()
+
+CACHE_SIZE = 4096
+
+MAX_FETCH_WORKERS = 8
+
+
+def _cache_put(cache, key, value):
+    # start over rather than grow past CACHE_SIZE
+    if len(cache) >= CACHE_SIZE:
+        cache.clear()
+    cache[key] = value
+
+
 class Defined(int): pass
 UNDEF = Defined(0)
 
 
+class _cached_attribute(object):
+    """
+    Computes an attribute on first access and stores it on the instance,
+    where it shadows this descriptor until deleted again.
+    """
+
+    def __init__(self, compute):
+        self.compute = compute
+        self.name = compute.__name__
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        value = obj.__dict__[self.name] = self.compute(obj)
+        return value
+
+
 class Context(object):
 
     def __init__(self, source=None, base=None):
-        self.language = None
-        self.vocab = None
+        # _children holds live subcontexts, to pass on invalidation; it is
+        # created along with the first one
+        self._children = None
+        # _subcontexts caches subcontexts by their serialized source
+        self._subcontexts = {}
+        # _expand_cache maps (term_curie_or_iri, use_vocab) to expand results
+        self._expand_cache = {}
+        # _shrink_cache maps IRIs to their shrink_iri results
+        self._shrink_cache = {}
+        # _resolve_cache maps IRIs to their resolution against base
+        self._resolve_cache = {}
+        self._language = None
+        self._vocab = None
         self.base = base
         self.doc_base = base
         self.terms = {}
-        # _alias maps NODE_KEY to list of aliases
+        # _alias maps NODE_KEY to tuple of aliases
         self._alias = {}
-        self._lookup = {}
+        # _alias_first maps NODE_KEY to its first alias
+        self._alias_first = {}
+        self._update_keys()
+        self._init_lookups()
         self._prefixes = {}
+        # _remote_contexts maps context URLs to their fetched JSON
+        self._remote_contexts = {}
         self.active = False
         if source:
             self.load(source)
 
+    @property
+    def language(self):
+        return self._language
+
+    @language.setter
+    def language(self, language):
+        if language != self._language:
+            self._language = language
+            self._clear_caches()
+
+    @property
+    def vocab(self):
+        return self._vocab
+
+    @vocab.setter
+    def vocab(self, vocab):
+        if vocab != self._vocab:
+            self._vocab = vocab
+            self._clear_caches()
+
     @property
     def base(self):
         return self._base
@@ -47,24 +120,56 @@ class Context(object):
             hash_index = base.find('#')
             if hash_index > -1:
                 base = base[0:hash_index]
-        self._base = self.resolve_iri(base) if (
-                hasattr(self, '_base') and base is not None) else base
-        self._basedomain = '%s://%s' % urlsplit(base)[0:2] if base else None
+        basedomain = '%s://%s' % urlsplit(base)[0:2] if base else None
+        if hasattr(self, '_base'):
+            if base is not None:
+                base = self.resolve_iri(base)
+            if base == self._base and basedomain == self._basedomain:
+                return
+            self._clear_caches()
+            self._resolve_cache.clear()
+        self._base = base
+        self._basedomain = basedomain
 
     def subcontext(self, source):
-        # IMPROVE: to optimize, implement SubContext with parent fallback support
-        ctx = Context()
-        ctx.language = self.language
-        ctx.vocab = self.vocab
-        ctx.base = self.base
-        ctx.doc_base = self.doc_base
-        ctx._alias = self._alias.copy()
-        ctx.terms = self.terms.copy()
-        ctx._lookup = self._lookup.copy()
-        ctx._prefixes = self._prefixes.copy()
-        ctx.load(source)
+        key = json.dumps(source, sort_keys=True)
+        ctx = self._subcontexts.get(key)
+        if ctx is None:
+            ctx = SubContext(self)
+            ctx.load(source)
+            _cache_put(self._subcontexts, key, ctx)
+            ctx._cache_key = key
         return ctx
 
+    def _clear_caches(self):
+        self._subcontexts.clear()
+        self._expand_cache.clear()
+        self._shrink_cache.clear()
+        if self._children:
+            for ctx in list(self._children):
+                ctx._parent_changed()
+
+    def get_term(self, name):
+        return self.terms.get(name)
+
+    def _init_lookups(self):
+        # _lookup_fwd and _lookup_rev map (idref, coercion or language,
+        # container) to terms, for forward and reverse properties
+        self._lookup_fwd = {}
+        self._lookup_rev = {}
+
+    def _own_lookup(self, reverse):
+        return self._lookup_rev if reverse else self._lookup_fwd
+
+    def _get_prefix(self, ns):
+        return self._prefixes.get(ns)
+
+    def _add_alias(self, key, name):
+        aliases = self._alias.get(key, ()) + (name,)
+        self._alias[key] = aliases
+        self._alias_first[key] = aliases[0]
+        self._update_keys()
+
     def get_id(self, obj):
         return self._get(obj, ID)
 
@@ -90,53 +195,63 @@ class Context(object):
         return self._get(obj, REV)
 
     def _get(self, obj, key):
-        for alias in self._alias.get(key, []):
-            if alias in obj:
-                return obj.get(alias)
+        for alias in self._alias.get(key, ()):
+            value = obj.get(alias, _MISSING)
+            if value is not _MISSING:
+                return value
         return obj.get(key)
 
     def get_key(self, key):
-        return self.get_keys(key)[0]
+        return self._alias_first.get(key, key)
 
     def get_keys(self, key):
-        return self._alias.get(key, [key])
+        return self._alias.get(key) or (key,)
+
+    _key_attrs = (('lang_key', LANG), ('id_key', ID), ('type_key', TYPE),
+            ('value_key', VALUE), ('list_key', LIST), ('rev_key', REV),
+            ('graph_key', GRAPH))
 
-    lang_key = property(lambda self: self.get_key(LANG))
-    id_key = property(lambda self: self.get_key(ID))
-    type_key = property(lambda self: self.get_key(TYPE))
-    value_key = property(lambda self: self.get_key(VALUE))
-    list_key = property(lambda self: self.get_key(LIST))
-    rev_key = property(lambda self: self.get_key(REV))
-    graph_key = property(lambda self: self.get_key(GRAPH))
+    def _update_keys(self):
+        # expose the current key for each keyword as a plain attribute
+        for attr, key in self._key_attrs:
+            setattr(self, attr, self.get_key(key))
 
     def add_term(self, name, idref, coercion=UNDEF, container=UNDEF,
             language=UNDEF, reverse=False):
+        self._add_term(name, idref, coercion, container, language, reverse)
+        self._clear_caches()
+
+    def _add_term(self, name, idref, coercion=UNDEF, container=UNDEF,
+            language=UNDEF, reverse=False):
+        # as add_term, leaving the caches to be cleared by the caller
         term = Term(idref, name, coercion, container, language, reverse)
         self.terms[name] = term
-        self._lookup[(idref, coercion or language, container, reverse)] = term
+        lookup = self._own_lookup(reverse)
+        lookup[(idref, coercion or language, container)] = term
         self._prefixes[idref] = name
 
     def find_term(self, idref, coercion=None, container=UNDEF,
             language=None, reverse=False):
-        lu = self._lookup
+        lu = self._lookup_rev if reverse else self._lookup_fwd
         if coercion is None:
             coercion = language
         if coercion is not UNDEF and container:
-            found = lu.get((idref, coercion, container, reverse))
+            found = lu.get((idref, coercion, container))
             if found: return found
         if coercion is not UNDEF:
-            found = lu.get((idref, coercion, UNDEF, reverse))
+            found = lu.get((idref, coercion, UNDEF))
             if found: return found
         if container:
-            found = lu.get((idref, coercion, container, reverse))
-            if found: return found
+            if coercion is UNDEF:
+                found = lu.get((idref, coercion, container))
+                if found: return found
         elif language:
-            found = lu.get((idref, UNDEF, LANG, reverse))
+            found = lu.get((idref, UNDEF, LANG))
             if found: return found
         else:
-            found = lu.get((idref, coercion or UNDEF, SET, reverse))
+            found = lu.get((idref, coercion or UNDEF, SET))
             if found: return found
-        return lu.get((idref, UNDEF, UNDEF, reverse))
+        return lu.get((idref, UNDEF, UNDEF))
 
     def resolve(self, curie_or_iri):
         iri = self.expand(curie_or_iri, False)
@@ -145,21 +260,33 @@ class Context(object):
         return self.resolve_iri(iri)
 
     def resolve_iri(self, iri):
-        return norm_url(self._base, iri)
+        resolved = self._resolve_cache.get(iri)
+        if resolved is None:
+            resolved = norm_url(self._base, iri)
+            _cache_put(self._resolve_cache, iri, resolved)
+        return resolved
 
     def isblank(self, ref):
         return ref.startswith('_:')
 
     def expand(self, term_curie_or_iri, use_vocab=True):
+        key = (term_curie_or_iri, use_vocab)
+        iri = self._expand_cache.get(key, _MISSING)
+        if iri is _MISSING:
+            iri = self._expand(term_curie_or_iri, use_vocab)
+            _cache_put(self._expand_cache, key, iri)
+        return iri
+
+    def _expand(self, term_curie_or_iri, use_vocab):
         if use_vocab:
-            term = self.terms.get(term_curie_or_iri)
+            term = self.get_term(term_curie_or_iri)
             if term:
                 return term.id
         is_term, pfx, local = self._prep_expand(term_curie_or_iri)
         if pfx == '_':
             return term_curie_or_iri
         if pfx is not None:
-            ns = self.terms.get(pfx)
+            ns = self.get_term(pfx)
             if ns and ns.id:
                 return ns.id + local
         elif is_term and use_vocab:
@@ -169,12 +296,20 @@ class Context(object):
         return self.resolve_iri(term_curie_or_iri)
 
     def shrink_iri(self, iri):
-        ns, name = split_iri(unicode(iri))
-        pfx = self._prefixes.get(ns)
+        iri = unicode(iri)
+        shrunk = self._shrink_cache.get(iri)
+        if shrunk is None:
+            shrunk = self._shrink_iri(iri)
+            _cache_put(self._shrink_cache, iri, shrunk)
+        return shrunk
+
+    def _shrink_iri(self, iri):
+        ns, name = split_iri(iri)
+        pfx = self._get_prefix(ns)
         if pfx:
             return u":".join((pfx, name))
         elif self._base:
-            if unicode(iri) == self._base:
+            if iri == self._base:
                 return ""
             elif iri.startswith(self._basedomain):
                     return iri[len(self._basedomain):]
@@ -188,7 +323,7 @@ class Context(object):
         ns, name = split_iri(iri)
         if ns == self.vocab:
             return name
-        pfx = self._prefixes.get(ns)
+        pfx = self._get_prefix(ns)
         if pfx:
             return u":".join((pfx, name))
         return iri
@@ -198,19 +333,26 @@ class Context(object):
         sources = []
         source = source if isinstance(source, list) else [source]
         self._prep_sources(base, source, sources)
-        for source_url, source in sources:
-            self._read_source(source, source_url)
+        try:
+            for source_url, source in sources:
+                self._read_source(source, source_url)
+        finally:
+            self._clear_caches()
 
     def _prep_sources(self, base, inputs, sources, referenced_contexts=None,
             in_source_url=None):
         referenced_contexts = referenced_contexts or set()
+        self._fetch_remote_contexts(base, inputs, referenced_contexts)
         for source in inputs:
             if isinstance(source, basestring):
                 source_url = urljoin(base, source)
                 if source_url in referenced_contexts:
                     raise errors.RECURSIVE_CONTEXT_INCLUSION
                 referenced_contexts.add(source_url)
-                source = source_to_json(source_url)
+                source = self._remote_contexts.get(source_url)
+                if source is None:
+                    source = source_to_json(source_url)
+                    self._remote_contexts[source_url] = source
                 if CONTEXT not in source:
                     raise errors.INVALID_REMOTE_CONTEXT
             else:
@@ -225,19 +367,52 @@ class Context(object):
             else:
                 sources.append((source_url, source))
 
+    def _fetch_remote_contexts(self, base, inputs, referenced_contexts):
+        # fetch several not yet loaded remote contexts concurrently
+        if ThreadPoolExecutor is None:
+            return
+        urls = []
+        for source in inputs:
+            if isinstance(source, basestring):
+                source_url = urljoin(base, source)
+                if (source_url not in referenced_contexts and
+                        source_url not in self._remote_contexts and
+                        source_url not in urls):
+                    urls.append(source_url)
+        if len(urls) < 2:
+            return
+        with ThreadPoolExecutor(min(len(urls), MAX_FETCH_WORKERS)) as executor:
+            for source_url, source in zip(urls,
+                    executor.map(source_to_json, urls)):
+                self._remote_contexts[source_url] = source
+
     def _read_source(self, source, source_url=None):
-        self.vocab = source.get(VOCAB, self.vocab)
+        self._vocab = source.get(VOCAB, self._vocab)
+        readers = self._keyword_readers
+        read_term = self._read_term
         for key, value in source.items():
-            if key == LANG:
-                self.language = value
-            elif key == VOCAB:
-                continue
-            elif key == BASE:
-                if source_url:
-                    continue
-                self.base = value
+            reader = readers.get(key)
+            if reader:
+                reader(self, value, source_url)
             else:
-                self._read_term(source, key, value)
+                read_term(source, key, value)
+
+    def _read_language(self, value, source_url):
+        self._language = value
+
+    def _read_vocab(self, value, source_url):
+        # already read before any terms, see _read_source
+        pass
+
+    def _read_base(self, value, source_url):
+        if not source_url:
+            self.base = value
+
+    _keyword_readers = {
+        LANG: _read_language,
+        VOCAB: _read_vocab,
+        BASE: _read_base,
+    }
 
     def _read_term(self, source, name, dfn):
         idref = None
@@ -256,56 +431,67 @@ class Context(object):
             coercion = dfn.get(TYPE, UNDEF)
             if coercion and coercion not in (ID, TYPE, VOCAB):
                 coercion = self._rec_expand(source, coercion)
-            self.add_term(name, idref, coercion,
+            self._add_term(name, idref, coercion,
                     dfn.get(CONTAINER, UNDEF), dfn.get(LANG, UNDEF), bool(rev))
         else:
             if isinstance(dfn, unicode):
                 idref = self._rec_expand(source, dfn)
-            self.add_term(name, idref)
+            self._add_term(name, idref)
 
         if idref in NODE_KEYS:
-            self._alias.setdefault(idref, []).append(name)
+            self._add_alias(idref, name)
 
     def _rec_expand(self, source, expr, prev=None):
-        if expr == prev or expr in NODE_KEYS:
-            return expr
-
-        is_term, pfx, nxt = self._prep_expand(expr)
-        if pfx:
-            iri = self._get_source_id(source, pfx)
-            if iri is None:
-                if pfx + ':' == self.vocab:
-                    return expr
+        # names already followed; following one again would never end
+        followed = set()
+        while True:
+            if expr == prev or expr in NODE_KEYS:
+                return expr
+
+            is_term, pfx, nxt = self._prep_expand(expr)
+            if pfx:
+                iri = self._get_source_id(source, pfx)
+                if iri is None:
+                    if pfx + ':' == self.vocab:
+                        return expr
+                    else:
+                        term = self.get_term(pfx)
+                        if term:
+                            iri = term.id
+
+                if iri is None:
+                    nxt = expr
                 else:
-                    term = self.terms.get(pfx)
-                    if term:
-                        iri = term.id
-
-            if iri is None:
-                nxt = expr
+                    self._follow(followed, pfx)
+                    nxt = iri + nxt
             else:
-                nxt = iri + nxt
-        else:
-            nxt = self._get_source_id(source, nxt) or nxt
-            if ':' not in nxt and self.vocab:
-                return self.vocab + nxt
+                iri = self._get_source_id(source, nxt)
+                if iri:
+                    self._follow(followed, nxt)
+                    nxt = iri
+                if ':' not in nxt and self.vocab:
+                    return self.vocab + nxt
 
-        return self._rec_expand(source, nxt, expr)
+            prev, expr = expr, nxt
+
+    def _follow(self, followed, name):
+        if name in followed:
+            raise errors.CYCLIC_IRI_MAPPING
+        followed.add(name)
 
     def _prep_expand(self, expr):
-        if ':' not in expr:
+        pfx, sep, local = expr.partition(':')
+        if not sep:
             return True, None, expr
-        pfx, local = expr.split(':', 1)
         if not local.startswith('//'):
             return False, pfx, local
-        else:
-            return False, None, expr
+        return False, None, expr
 
     def _get_source_id(self, source, key):
         # .. from source dict or if already defined
         term = source.get(key)
         if term is None:
-            dfn = self.terms.get(key)
+            dfn = self.get_term(key)
             if dfn:
                 term = dfn.id
         elif isinstance(term, dict):
@@ -313,6 +499,133 @@ class Context(object):
         return term
 
 
-Term = namedtuple('Term',
-        'id, name, type, container, language, reverse')
-Term.__new__.__defaults__ = (UNDEF, UNDEF, UNDEF, False)
+class SubContext(Context):
+    """
+    A context nested within a parent context. Definitions, aliases,
+    language and vocab not set by the subcontext itself are looked up in the
+    parent, rather than copied. The base is taken from the parent when the
+    subcontext is created.
+    """
+
+    def __init__(self, parent):
+        self.parent = parent
+        # _cache_key is set while the parent hands this out from subcontext
+        self._cache_key = None
+        # _own_alias maps NODE_KEY to the aliases added by this subcontext;
+        # _alias combines these with those of the parent
+        self._own_alias = {}
+        super(SubContext, self).__init__()
+        self._remote_contexts = parent._remote_contexts
+        # _MISSING marks language and vocab as following the parent
+        self._language = _MISSING
+        self._vocab = _MISSING
+        self._base = parent._base
+        self._basedomain = parent._basedomain
+        self.doc_base = parent.doc_base
+        if parent._children is None:
+            parent._children = WeakSet()
+        parent._children.add(self)
+
+    def _clear_caches(self):
+        # once changed, this is no longer what its source would produce
+        if self._cache_key is not None:
+            if self.parent._subcontexts.get(self._cache_key) is self:
+                del self.parent._subcontexts[self._cache_key]
+            self._cache_key = None
+        self.__dict__.pop('_lookup_fwd', None)
+        self.__dict__.pop('_lookup_rev', None)
+        super(SubContext, self)._clear_caches()
+
+    def _parent_changed(self):
+        self._update_keys()
+        self._clear_caches()
+
+    def get_term(self, name):
+        term = self.terms.get(name)
+        if term is None:
+            return self.parent.get_term(name)
+        return term
+
+    @Context.language.getter
+    def language(self):
+        language = self._language
+        if language is _MISSING:
+            return self.parent.language
+        return language
+
+    @Context.vocab.getter
+    def vocab(self):
+        vocab = self._vocab
+        if vocab is _MISSING:
+            return self.parent.vocab
+        return vocab
+
+    def _add_alias(self, key, name):
+        self._own_alias[key] = self._own_alias.get(key, ()) + (name,)
+        self._update_keys()
+
+    def _update_keys(self):
+        parent = self.parent
+        if not self._own_alias:
+            # no aliases of its own, so the keys are those of the parent
+            self._alias = parent._alias
+            self._alias_first = parent._alias_first
+            for attr, key in self._key_attrs:
+                setattr(self, attr, getattr(parent, attr))
+            return
+        alias = dict(parent._alias)
+        for key, aliases in self._own_alias.items():
+            alias[key] = alias.get(key, ()) + aliases
+        self._alias = alias
+        self._alias_first = dict(
+                (key, aliases[0]) for key, aliases in alias.items())
+        super(SubContext, self)._update_keys()
+
+    def _init_lookups(self):
+        # own definitions; _lookup_fwd and _lookup_rev combine these with
+        # the parent tables on first use after a change
+        self._own_lookup_fwd = {}
+        self._own_lookup_rev = {}
+
+    def _own_lookup(self, reverse):
+        return self._own_lookup_rev if reverse else self._own_lookup_fwd
+
+    @_cached_attribute
+    def _lookup_fwd(self):
+        return _combine_lookups(self._own_lookup_fwd, self.parent._lookup_fwd)
+
+    @_cached_attribute
+    def _lookup_rev(self):
+        return _combine_lookups(self._own_lookup_rev, self.parent._lookup_rev)
+
+    def _get_prefix(self, ns):
+        pfx = self._prefixes.get(ns)
+        if pfx is None:
+            return self.parent._get_prefix(ns)
+        return pfx
+
+
+def _combine_lookups(own, inherited):
+    if not own:
+        return inherited
+    combined = dict(inherited)
+    combined.update(own)
+    return combined
+
+
+class Term(object):
+
+    __slots__ = ('id', 'name', 'type', 'container', 'language', 'reverse')
+
+    def __init__(self, id, name, type=UNDEF, container=UNDEF,
+            language=UNDEF, reverse=False):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.container = container
+        self.language = language
+        self.reverse = reverse
+
+    def __repr__(self):
+        return 'Term(%s)' % ', '.join('%s=%r' % (attr, getattr(self, attr))
+                for attr in self.__slots__)
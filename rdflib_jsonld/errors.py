@@ -3,4 +3,5 @@ class JSONLDException(ValueError):
 
 # http://www.w3.org/TR/json-ld-api/#idl-def-JsonLdErrorCode.{code-message}
 RECURSIVE_CONTEXT_INCLUSION = JSONLDException("recursive context inclusion")
+CYCLIC_IRI_MAPPING = JSONLDException("cyclic IRI mapping")
 INVALID_REMOTE_CONTEXT = JSONLDException("invalid remote context")
@@ -131,7 +131,7 @@ class Parser(object):
         if context.vocab:
             dataset.bind(None, context.vocab)
         for name, term in context.terms.items():
-            if term.id and term.id.endswith(VOCAB_DELIMS):
+            if term.id and term.id[-1] in VOCAB_DELIMS:
                 dataset.bind(name, term.id)
 
         graph = dataset.default_context if dataset.context_aware else dataset
@@ -187,7 +187,7 @@ class Parser(object):
         else:
             obj_nodes = [obj]
 
-        term = context.terms.get(key)
+        term = context.get_term(key)
         if term:
             term_id = term.id
             if term.container == LIST:
@@ -301,7 +301,7 @@ class Parser(object):
                             VALUE: node}
 
         lang = context.get_language(node)
-        if lang or context.get_key(VALUE) in node or VALUE in node:
+        if lang or context.value_key in node or VALUE in node:
             value = context.get_value(node)
             if value is None:
                 return None
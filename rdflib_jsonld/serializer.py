@@ -110,7 +110,7 @@ def from_rdf(graph, context_data=None, base=None,
 
     if converter.context.active:
         if isinstance(result, list):
-            result = {context.get_key(GRAPH): result}
+            result = {context.graph_key: result}
         result[CONTEXT] = context_data
 
     return result
@@ -157,7 +157,7 @@ class Converter(object):
                     continue
                 obj[context.graph_key] = nodes
 
-            if objs and objs[0].get(context.get_key(ID)) == graphname:
+            if objs and objs[0].get(context.id_key) == graphname:
                 objs[0].update(obj)
             else:
                 objs.append(obj)
@@ -255,7 +255,7 @@ class Converter(object):
         else:
             p_key = context.to_symbol(p)
             # TODO: for coercing curies - quite clumsy; unify to_symbol and find_term?
-            key_term = context.terms.get(p_key)
+            key_term = context.get_term(p_key)
             if key_term and (key_term.type or key_term.container):
                 p_key = p
             if not term and p == RDF.type and not self.use_rdf_type:
@@ -51,6 +51,31 @@ def test_select_term_based_on_value_characteristics():
     #ctx.find_term('http://example.org/ns/creator', reverse=True)
 
 
+def test_select_term_based_on_direction():
+    ctx = Context()
+    ctx.add_term('knows', 'http://example.org/ns/knows')
+    ctx.add_term('knownBy', 'http://example.org/ns/knows', reverse=True)
+
+    assert ctx.find_term('http://example.org/ns/knows').name == 'knows'
+    assert ctx.find_term('http://example.org/ns/knows',
+        reverse=True).name == 'knownBy'
+
+
+def test_select_term_in_a_subcontext():
+    ctx = Context()
+    ctx.add_term('knows', 'http://example.org/ns/knows')
+    sub = ctx.subcontext({})
+    assert sub.find_term('http://example.org/ns/knows').name == 'knows'
+    sub.add_term('knownBy', 'http://example.org/ns/knows', reverse=True)
+    assert sub.find_term('http://example.org/ns/knows',
+        reverse=True).name == 'knownBy'
+
+    # test_subcontext_selects_new_parent_terms():
+    ctx.add_term('name', 'http://example.org/ns/name')
+    assert sub.find_term('http://example.org/ns/name').name == 'name'
+    assert ctx.find_term('http://example.org/ns/knows', reverse=True) is None
+
+
 def test_getting_keyword_values_from_nodes():
     ctx = Context()
     assert ctx.get_id({'@id': 'urn:x:1'}) == 'urn:x:1'
@@ -81,6 +106,44 @@ def test_parsing_a_context_expands_prefixes():
     assert ctx.to_symbol('http://example.org/ns/term') == 'term'
 
 
+def test_expanding_after_changes():
+    ctx = Context({'@vocab': 'http://example.org/ns/'})
+    assert ctx.expand('term') == 'http://example.org/ns/term'
+    ctx.load({'@vocab': 'http://example.org/vocab/'})
+    assert ctx.expand('term') == 'http://example.org/vocab/term'
+    ctx.add_term('term', 'http://example.org/ns/other')
+    assert ctx.expand('term') == 'http://example.org/ns/other'
+
+    # test_expanding_after_setting_vocab():
+    ctx = Context({'@vocab': 'http://example.org/ns/'})
+    assert ctx.expand('term') == 'http://example.org/ns/term'
+    ctx.vocab = 'http://example.org/vocab/'
+    assert ctx.expand('term') == 'http://example.org/vocab/term'
+
+
+def test_subcontext_expands_after_parent_changes():
+    ctx = Context({'x': 'http://example.org/ns/'})
+    sub = ctx.subcontext({'y': 'http://example.org/other/'})
+    assert sub.expand('x:1') == 'http://example.org/ns/1'
+    ctx.add_term('x', 'http://example.org/vocab/')
+    assert sub.expand('x:1') == 'http://example.org/vocab/1'
+    assert sub.expand('x:2') == 'http://example.org/vocab/2'
+
+
+def test_shrinking_after_changes():
+    ctx = Context(base='http://example.org/')
+    assert ctx.shrink_iri('http://example.org/ns/term') == '/ns/term'
+    ctx.add_term('x', 'http://example.org/ns/')
+    assert ctx.shrink_iri('http://example.org/ns/term') == 'x:term'
+
+    # test_subcontext_shrinking_after_parent_changes():
+    sub = ctx.subcontext({'y': 'http://example.org/other/'})
+    assert sub.shrink_iri('http://example.org/ns/term') == 'x:term'
+    ctx.add_term('ns', 'http://example.org/ns/')
+    assert sub.shrink_iri('http://example.org/ns/term') == 'ns:term'
+    assert sub.shrink_iri('http://example.org/ns/other') == 'ns:other'
+
+
 def test_resolving_iris():
     ctx = Context({'@base': 'http://example.org/path/leaf'})
     assert ctx.resolve('/') == 'http://example.org/'
@@ -106,6 +169,61 @@ def test_creating_a_subcontext():
     ctx = Context()
     ctx4 = ctx.subcontext({'lang': '@language'})
     assert ctx4.get_language({'lang': 'en'}) == 'en'
+    assert ctx4.lang_key == 'lang'
+
+    # test_subcontext_keys_after_parent_changes():
+    ctx.load({'iri': '@id'})
+    assert ctx4.id_key == ctx4.get_key('@id') == 'iri'
+
+
+def test_subcontext_falls_back_to_parent():
+    ctx = Context({'x': 'http://example.org/ns/', 'iri': '@id'})
+    sub = ctx.subcontext({'label': 'x:label', 'ref': '@id'})
+    assert sub.expand('x:term') == 'http://example.org/ns/term'
+    assert sub.expand('label') == 'http://example.org/ns/label'
+    assert sub.shrink_iri('http://example.org/ns/term') == 'x:term'
+    assert sub.get_keys('@id') == ('iri', 'ref')
+    assert sub.get_key('@id') == 'iri'
+
+    # test_parent_is_not_modified():
+    assert ctx.get_term('label') is None
+    assert ctx.get_keys('@id') == ('iri',)
+
+
+def test_subcontext_follows_parent_changes():
+    ctx = Context({'iri': '@id'})
+    sub = ctx.subcontext({'ref': '@id'})
+    other = ctx.subcontext({'label': 'http://example.org/ns/label'})
+    ctx.load({'ident': '@id', '@vocab': 'http://example.org/vocab/',
+        '@language': 'en'})
+    assert sub.get_id({'ident': 1}) == 1
+    assert sub.get_keys('@id') == ('iri', 'ident', 'ref')
+    assert sub.id_key == 'iri'
+    assert other.expand('foo') == 'http://example.org/vocab/foo'
+    assert other.language == 'en'
+
+    # test_subcontext_overrides_parent_settings():
+    sub = ctx.subcontext({'@vocab': None, '@language': 'sv'})
+    ctx.load({'@vocab': 'http://example.org/ns/', '@language': 'de'})
+    assert sub.vocab is None
+    assert sub.language == 'sv'
+
+
+def test_reusing_subcontexts():
+    ctx = Context({'x': 'http://example.org/ns/'})
+    sub = ctx.subcontext({'label': 'x:label'})
+    assert ctx.subcontext({'label': 'x:label'}) is sub
+
+    # test_subcontexts_are_recreated_after_changes():
+    ctx.load({'x': 'http://example.org/other/'})
+    assert ctx.subcontext({'label': 'x:label'}) is not sub
+
+    # test_changed_subcontexts_are_not_reused():
+    sub = ctx.subcontext({'label': 'x:label'})
+    sub.add_term('b', 'http://example.org/ns/b')
+    other = ctx.subcontext({'label': 'x:label'})
+    assert other is not sub
+    assert other.get_term('b') is None
 
 
 def test_prefix_like_vocab():
@@ -135,6 +253,25 @@ def test_loading_contexts():
     ctx = Context([source2])
     assert ctx.expand('n') == 'http://example.org/vocab/name'
 
+def test_remote_contexts_are_fetched_once():
+    source1 = "http://example.org/names.jsonld"
+    source2 = "http://example.org/labels.jsonld"
+    SOURCES[source1] = {'@context': {"n": "http://example.org/vocab/name"}}
+    SOURCES[source2] = {'@context': {"l": "http://example.org/vocab/label"}}
+    fetched = []
+    def fetch(url):
+        fetched.append(url)
+        return SOURCES.get(url)
+    context.source_to_json = fetch
+    try:
+        ctx = Context([source1, source2])
+        sub = ctx.subcontext([source1, {"m": "http://example.org/vocab/m"}])
+    finally:
+        context.source_to_json = SOURCES.get
+    assert sorted(fetched) == [source2, source1]
+    assert ctx.expand('l') == 'http://example.org/vocab/label'
+    assert sub.expand('n') == 'http://example.org/vocab/name'
+
 def test_use_base_in_local_context():
     ctx = Context({'@base': "/local"})
     assert ctx.base == '/local'
@@ -150,6 +287,12 @@ def test_resolve_relative_base():
     assert ctx.base == "http://example.org/app/"
     assert ctx.resolve_iri("../other") == "http://example.org/other"
 
+def test_resolve_after_base_change():
+    ctx = Context(base="http://example.org/app/data/item")
+    assert ctx.resolve_iri("other") == "http://example.org/app/data/other"
+    ctx.base = "http://example.org/"
+    assert ctx.resolve_iri("other") == "http://example.org/other"
+
 def test_set_null_base():
     ctx = Context(base="http://example.org/app/data/item",
             source={'@base': None})
@@ -168,6 +311,18 @@ def test_recursive_context_inclusion_error():
     SOURCES[ctx_url] = {'@context': ctx_url}
     ctx = Context(ctx_url)
 
+@_expect_exception(errors.CYCLIC_IRI_MAPPING)
+def test_self_referencing_prefix_error():
+    ctx = Context({'x': 'x:p'})
+
+@_expect_exception(errors.CYCLIC_IRI_MAPPING)
+def test_cyclic_iri_mapping_error():
+    ctx = Context({'x': 'y:p', 'y': 'x:q'})
+
+@_expect_exception(errors.CYCLIC_IRI_MAPPING)
+def test_cyclic_term_mapping_error():
+    ctx = Context({'a': 'b', 'b': 'a'})
+
 @_expect_exception(errors.INVALID_REMOTE_CONTEXT)
 def test_invalid_remote_context():
     ctx_url = "http://example.org/recursive.jsonld"